@@ -0,0 +1,160 @@
+# Description: Opening book for XiangqiGame. The book is built from recorded games and saved as a table of
+#              fixed size records sorted by position hash (XiangqiGame.get_hash). Lookups memory-map the
+#              file and binary search it, so the book is never loaded into memory as a whole.
+#
+# File layout (all numbers little-endian):
+#   header   magic b"XQBK", version (uint16), flags (uint16, 0), record count (uint64)
+#   records  position hash (uint64), from square (uint8), to square (uint8), weight (uint16), sorted by
+#            hash and then by weight (highest first)
+#
+# usage: python XiangqiBook.py build archive.xqr book.xqb [--max-ply N] [--min-count N]
+
+import mmap
+import struct
+import sys
+
+import XiangqiGame
+
+
+MAGIC = b"XQBK"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")
+_RECORD = struct.Struct("<QBBH")
+_MAX_WEIGHT = 0xFFFF
+
+
+# builds a book from games (an iterable of move lists, algebraic or integer squares, or the move bytes of
+# a XiangqiRecords file) and writes it to path. Every move played in the first max_ply plies of a game
+# is counted for the position it was played in, moves seen fewer than min_count times are left out and
+# the count becomes the move's weight. Returns the number of book records written
+def build_opening_book(games, path, max_ply=20, min_count=1):
+    counts = {}
+
+    for moves in games:
+        game = XiangqiGame.XiangqiGame()
+        game.start_game()
+
+        if isinstance(moves, (bytes, bytearray, memoryview)):
+            moves = zip(moves[0::2], moves[1::2])
+
+        for ply, (start, stop) in enumerate(moves):
+            if ply >= max_ply:
+                break
+
+            if not isinstance(start, int):
+                start = XiangqiGame.SQUARE_INDEX[start]
+                stop = XiangqiGame.SQUARE_INDEX[stop]
+
+            position_hash = game.get_hash()
+
+            # an illegal move ends what the game can teach the book
+            if game.make_move_sq(start, stop) is False:
+                break
+
+            key = (position_hash, start, stop)
+            counts[key] = counts.get(key, 0) + 1
+
+    records = [(position_hash, -count, start, stop) for (position_hash, start, stop), count in counts.items()
+               if count >= min_count]
+    records.sort()
+
+    with open(path, "wb") as book_file:
+        book_file.write(_HEADER.pack(MAGIC, VERSION, 0, len(records)))
+
+        for position_hash, negative_count, start, stop in records:
+            book_file.write(_RECORD.pack(position_hash, start, stop, min(-negative_count, _MAX_WEIGHT)))
+
+    return len(records)
+
+
+# memory-mapped opening book, see build_opening_book. lookup(position_hash) binary searches the sorted
+# records, O(log n) in the number of records, and only touches the pages it reads
+class OpeningBook:
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, count = _HEADER.unpack_from(self._map, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a version %d Xiangqi opening book" % (path, VERSION))
+
+        self._count = count
+
+    def __len__(self):
+
+        return self._count
+
+    # returns the hash of record number index
+    def _hash_at(self, index):
+
+        return int.from_bytes(self._map[_HEADER.size + index * _RECORD.size:
+                                        _HEADER.size + index * _RECORD.size + 8], "little")
+
+    # returns [(from square, to square, weight), ...] for the position with this hash, highest weight first
+    def lookup(self, position_hash):
+        low = 0
+        high = self._count
+
+        # first record with a hash >= position_hash
+        while low < high:
+            middle = (low + high) // 2
+
+            if self._hash_at(middle) < position_hash:
+                low = middle + 1
+
+            else:
+                high = middle
+
+        candidates = []
+
+        while low < self._count:
+            record_hash, start, stop, weight = _RECORD.unpack_from(self._map, _HEADER.size + low * _RECORD.size)
+
+            if record_hash != position_hash:
+                break
+
+            candidates.append((start, stop, weight))
+            low += 1
+
+        return candidates
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+
+    import XiangqiRecords
+
+    parser = argparse.ArgumentParser(description="build a Xiangqi opening book from a game record file")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("records")
+    parser.add_argument("book")
+    parser.add_argument("--max-ply", type=int, default=20)
+    parser.add_argument("--min-count", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with XiangqiRecords.GameRecordReader(args.records) as reader:
+        count = build_opening_book(reader, args.book, args.max_ply, args.min_count)
+
+    print("%d book moves written to %s" % (count, args.book))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
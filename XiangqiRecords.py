@@ -0,0 +1,220 @@
+# Description: Compact binary game records for XiangqiGame. Every move is 2 bytes (from square and to
+#              square, 0-89 as in XiangqiGame.SQUARE_INDEX) and the file carries an index of where
+#              each game starts, so a reader can memory-map the file and go straight to any game
+#              without parsing text or building strings.
+#
+# File layout (all numbers little-endian):
+#   header  magic b"XQGR", version (uint16), flags (uint16, 0), game count (uint32), index offset (uint64)
+#   moves   the games' move bytes one after another, games start from the opening position
+#   index   game count + 1 offsets (uint64), game i is the bytes from offset i up to offset i + 1
+#
+# usage: python XiangqiRecords.py validate archive.xqr [--workers N]
+
+import mmap
+import os
+import struct
+import sys
+
+import XiangqiGame
+
+
+MAGIC = b"XQGR"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHIQ")
+_OFFSET = struct.Struct("<Q")
+
+
+# encodes one game (a list of (start, stop) pairs, algebraic names or integer squares) as move bytes.
+# Raises ValueError for a square that is not on the board
+def encode_moves(moves):
+    data = bytearray()
+
+    for move in moves:
+        start, stop = move
+
+        if not isinstance(start, int):
+            start = XiangqiGame.SQUARE_INDEX.get(start, -1)
+            stop = XiangqiGame.SQUARE_INDEX.get(stop, -1)
+
+        if not 0 <= start < 90 or not 0 <= stop < 90:
+            raise ValueError("move %r is not between two squares of the board" % (move,))
+
+        data.append(start)
+        data.append(stop)
+
+    return bytes(data)
+
+
+# writes games (an iterable of move lists, or of already encoded move bytes) to path in the binary record
+# format. Games are streamed to the file, only the index of offsets is kept in memory. Returns the count.
+# The file is written next to path and renamed into place once complete: if a game cannot be encoded the
+# error is raised and whatever was at path is left as it was
+def write_game_records(path, games):
+    offsets = []
+    temporary_path = path + ".tmp"
+
+    try:
+        with open(temporary_path, "wb") as record_file:
+            record_file.write(_HEADER.pack(MAGIC, VERSION, 0, 0, 0))   # filled in once the count is known
+            position = _HEADER.size
+
+            for moves in games:
+                data = moves if isinstance(moves, (bytes, bytearray)) else encode_moves(moves)
+                offsets.append(position)
+                record_file.write(data)
+                position += len(data)
+
+            offsets.append(position)
+            record_file.write(b"".join(_OFFSET.pack(offset) for offset in offsets))
+            record_file.seek(0)
+            record_file.write(_HEADER.pack(MAGIC, VERSION, 0, len(offsets) - 1, position))
+
+        os.replace(temporary_path, path)
+
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+        raise
+
+    return len(offsets) - 1
+
+
+# memory-mapped reader for a game record file. reader[i] is game i's move bytes as a memoryview into the
+# mapping (nothing is copied), len(reader) is the number of games and iterating goes through them in order
+class GameRecordReader:
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, flags, count, index_offset = _HEADER.unpack_from(self._map, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("%s is not a version %d Xiangqi game record file" % (path, VERSION))
+
+        self._count = count
+        self._index_offset = index_offset
+
+    def __len__(self):
+
+        return self._count
+
+    def __getitem__(self, game_index):
+        if game_index < 0:
+            game_index += self._count
+
+        if not 0 <= game_index < self._count:
+            raise IndexError("game index out of range")
+
+        start, stop = struct.unpack_from("<QQ", self._map, self._index_offset + 8 * game_index)
+
+        return self._view[start:stop]
+
+    def __iter__(self):
+        for game_index in range(self._count):
+            yield self[game_index]
+
+    # returns the replay result for game game_index (see XiangqiGame.replay_game)
+    def replay(self, game_index):
+
+        return XiangqiGame.replay_game(self[game_index])
+
+    def close(self):
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# replays games first to last - 1 of the file at path, run in a worker process which maps the file itself
+# so only the two numbers go to the worker and only the results come back
+def _replay_range(path, first, last):
+    with GameRecordReader(path) as reader:
+
+        return [XiangqiGame.replay_game(reader[game_index]) for game_index in range(first, last)]
+
+
+# yields the replay result of every game in the record file at path, in file order, using a pool of worker
+# processes (default one per core) that each memory-map the file and replay chunk_size games per task
+def iter_replay_records(path, workers=None, chunk_size=256):
+    import collections
+    import concurrent.futures
+    import os
+
+    with GameRecordReader(path) as reader:
+        count = len(reader)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+
+        for first in range(0, count, chunk_size):
+            yield from _replay_range(path, first, min(first + chunk_size, count))
+
+        return
+
+    ranges = iter(range(0, count, chunk_size))
+    pending = collections.deque()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+
+        while True:
+
+            while len(pending) < workers * 2:
+                first = next(ranges, None)
+
+                if first is None:
+                    break
+
+                pending.append(executor.submit(_replay_range, path, first, min(first + chunk_size, count)))
+
+            if not pending:
+                break
+
+            yield from pending.popleft().result()
+
+
+# replays every game in the record file at path and returns the list of results, see iter_replay_records
+def replay_records(path, workers=None, chunk_size=256):
+
+    return list(iter_replay_records(path, workers, chunk_size))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Xiangqi binary game records")
+    parser.add_argument("command", choices=["validate"])
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    games = 0
+    illegal = 0
+
+    for game_index, result in enumerate(iter_replay_records(args.path, args.workers)):
+        games += 1
+
+        if result["first_illegal_move"] is not None:
+            illegal += 1
+            print("game %d: illegal move %d" % (game_index, result["first_illegal_move"]))
+
+    print("%d games, %d with an illegal move" % (games, illegal))
+
+    return 1 if illegal else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# Description: Parallel search for XiangqiGame (Lazy SMP). N worker processes search the same root position
+#              at the same time and share one transposition table in a multiprocessing.shared_memory
+#              block, so what one worker learns about a position the others find in the table. The
+#              first worker's answer is the result; once it is done the others are stopped.
+#
+# Shared table layout: entries slots of two uint64 each, slot = hash % entries. The second word is the
+# packed entry (see _pack_entry) and the first the hash XOR the packed entry. There are no locks: two
+# processes writing one slot at once can leave words from different entries, but then the XOR no longer
+# gives back the hash and the reader treats the slot as empty.
+#
+# usage: python XiangqiSMP.py [--depth N | --movetime MS] [--workers N] [--fen FEN]
+
+import sys
+from multiprocessing import shared_memory
+
+import XiangqiGame
+
+
+_SCORE_OFFSET = 1 << 17   # scores (at most MATE_SCORE + a ply count) are stored + this, in 18 bits
+_NO_SQUARE = 127
+
+
+# packs (depth, score, flag, move) into one nonzero 64-bit word: bit 0 set, 18 bits score, 7 depth, 2 flag,
+# 7 + 7 from and to square (127 for no move)
+def _pack_entry(depth, score, flag, move):
+    if move is None:
+        from_sq = to_sq = _NO_SQUARE
+
+    else:
+        from_sq = move[0][0] * 9 + move[0][1]
+        to_sq = move[1][0] * 9 + move[1][1]
+
+    return 1 | (score + _SCORE_OFFSET) << 1 | min(depth, 127) << 19 | flag << 26 | from_sq << 28 | to_sq << 35
+
+
+def _unpack_entry(data):
+    from_sq = data >> 28 & 127
+    to_sq = data >> 35 & 127
+    move = None if from_sq == _NO_SQUARE else (divmod(from_sq, 9), divmod(to_sq, 9))
+
+    return data >> 19 & 127, (data >> 1 & 0x3FFFF) - _SCORE_OFFSET, data >> 26 & 3, move
+
+
+# transposition table in shared memory with the get / table[hash] = entry interface XiangqiGame.search
+# uses. Made with no name it creates a new block of entries slots, made with the name of an existing block
+# it attaches to it. Worker processes get it through fork, or attach by name when pickled
+class SharedTranspositionTable:
+
+    def __init__(self, entries=1 << 20, name=None):
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=entries * 16)
+
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+
+        self._entries = self._memory.size // 16
+        self._slots = self._memory.buf.cast("Q")
+        self._owner = name is None
+
+    @property
+    def name(self):
+
+        return self._memory.name
+
+    def __len__(self):
+
+        return self._entries
+
+    def get(self, position_hash, default=None):
+        slot = (position_hash % self._entries) * 2
+        data = self._slots[slot + 1]
+
+        if data == 0 or self._slots[slot] ^ data != position_hash:
+            return default
+
+        return _unpack_entry(data)
+
+    def __setitem__(self, position_hash, entry):
+        slot = (position_hash % self._entries) * 2
+        data = _pack_entry(*entry)
+        self._slots[slot] = position_hash ^ data
+        self._slots[slot + 1] = data
+
+    # empties every slot
+    def clear(self):
+        self._memory.buf[:] = bytes(self._memory.size)
+
+    # detaches from the block, and frees it if this object created it
+    def close(self):
+        if self._slots is not None:
+            self._slots.release()
+            self._slots = None
+            self._memory.close()
+
+            if self._owner:
+                self._memory.unlink()
+
+    # lets the block's own cleanup close it (a worker that attached never calls close())
+    def __del__(self):
+        if getattr(self, "_slots", None) is not None:
+            self._slots.release()
+            self._slots = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # pickled (a spawned worker process) as its name, the copy attaches to the same block
+    def __reduce__(self):
+
+        return SharedTranspositionTable, (self._entries, self.name)
+
+
+# runs in each worker process. Workers with an odd index search one ply deeper than asked, so the
+# workers do not all walk the same tree in step and the deeper ones fill the table ahead of the rest
+def _search_worker(table, packed_game, worker_index, depth, time_limit_ms, stop_event, results):
+    game = XiangqiGame.XiangqiGame.unpack(packed_game)
+
+    if depth is not None and worker_index % 2 == 1:
+        depth += 1
+
+    move, score = game.search(depth, time_limit_ms, stop_event=stop_event, transposition_table=table)
+    results.put((worker_index, move, score, game.get_search_nodes()))
+
+
+# reads worker answers into answers until done() is true. A worker that died without answering (it
+# raised or was killed) raises RuntimeError instead of waiting for it forever
+def _collect_answers(results, processes, answers, done):
+    import queue
+
+    while not done():
+        try:
+            worker_index, move, score, nodes = results.get(timeout=0.1)
+
+        except queue.Empty:
+            for worker_index, process in enumerate(processes):
+                if worker_index not in answers and not process.is_alive() and results.empty():
+                    raise RuntimeError("search worker %d exited with code %s without an answer"
+                                       % (worker_index, process.exitcode))
+
+            continue
+
+        answers[worker_index] = (move, score, nodes)
+
+
+# searches game's position with workers processes (default one per core) sharing a table of table_entries
+# slots. depth and time_limit_ms work as in XiangqiGame.search. Returns ((start, stop), score, nodes)
+# with the first worker's move and score and the nodes searched by all workers together
+def parallel_search(game, depth=None, time_limit_ms=None, workers=None, table_entries=1 << 20):
+    import multiprocessing
+    import os
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if depth is None and time_limit_ms is None:
+        time_limit_ms = 100
+
+    context = multiprocessing.get_context()
+    stop_event = context.Event()
+    results = context.Queue()
+    packed_game = game.pack()
+
+    with SharedTranspositionTable(table_entries) as table:
+        processes = [context.Process(target=_search_worker,
+                                     args=(table, packed_game, worker_index, depth, time_limit_ms, stop_event,
+                                           results))
+                     for worker_index in range(workers)]
+
+        for process in processes:
+            process.start()
+
+        answers = {}
+
+        try:
+            # the first worker decides, the helpers are stopped once it has
+            _collect_answers(results, processes, answers, lambda: 0 in answers)
+            stop_event.set()
+            _collect_answers(results, processes, answers, lambda: len(answers) == workers)
+
+        finally:
+            stop_event.set()
+
+            for process in processes:
+                process.join()
+
+    move, score, nodes = answers[0]
+
+    return move, score, sum(answer[2] for answer in answers.values())
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="parallel (Lazy SMP) search of a Xiangqi position")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--movetime", type=int, default=None, help="time limit in milliseconds")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fen", default=XiangqiGame.STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    game = XiangqiGame.XiangqiGame.from_fen(args.fen)
+    start = time.perf_counter()
+    move, score, nodes = parallel_search(game, args.depth, args.movetime, args.workers)
+    elapsed = time.perf_counter() - start
+    print("best move %s%s score %d, %d nodes in %.2f s (%.0f nodes/s)"
+          % (move[0] if move else "-", move[1] if move else "", score, nodes, elapsed, nodes / elapsed))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
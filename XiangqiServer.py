@@ -0,0 +1,316 @@
+# Description: asyncio game server for XiangqiGame. One event loop holds many games, keyed by game id, and
+#              talks newline-delimited JSON over TCP or a Unix socket. Clients send requests, get one
+#              reply per request and receive "state" events for every game they subscribed to. Engine
+#              moves are searched in a process pool on a packed copy of the game (XiangqiGame.pack) so
+#              the loop never waits for the engine.
+#
+# Requests (one JSON object per line, "ref" is copied into the reply so clients can match them up):
+#   {"op": "new", "game": ID (optional), "fen": FEN (optional)}
+#   {"op": "state", "game": ID}
+#   {"op": "make_move", "game": ID, "start": "h3", "stop": "e3"}
+#   {"op": "engine_move", "game": ID, "depth": N (optional), "movetime": MS (optional)}
+#   {"op": "legal_moves", "game": ID}
+#   {"op": "subscribe", "game": ID}   /   {"op": "unsubscribe", "game": ID}
+#   {"op": "close", "game": ID}
+#
+# Replies are {"ok": true, ...} or {"ok": false, "error": "..."}; a game's state is pushed to its
+# subscribers as {"event": "state", "game": ID, "fen": ..., "state": ..., "turn": ..., "red_in_check": ...,
+# "black_in_check": ..., "last_move": [start, stop]} after every move.
+#
+# usage: python XiangqiServer.py [--host HOST] [--port PORT | --unix PATH] [--engine-workers N]
+
+import asyncio
+import json
+import sys
+
+import XiangqiGame
+
+
+# runs in an engine worker process: searches the packed game and returns the move (or None)
+def _engine_search(packed_game, depth, time_limit_ms):
+    game = XiangqiGame.XiangqiGame.unpack(packed_game)
+    move, score = game.search(depth, time_limit_ms)
+
+    return move
+
+
+# JSON true and false come in as bools, which are ints to isinstance
+def _is_int(value):
+
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class XiangqiServer:
+
+    def __init__(self, engine_workers=None):
+        self._games = {}   # game id -> XiangqiGame
+        self._last_moves = {}   # game id -> [start, stop] of the last move played
+        self._subscribers = {}   # game id -> set of stream writers
+        self._next_game_id = 1
+        self._engine_workers = engine_workers
+        self._executor = None   # created with the first engine move
+        self._servers = []
+        self._tasks = set()   # engine moves still being searched
+
+    # listens on a TCP port, returns the asyncio server
+    async def start(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        self._servers.append(server)
+
+        return server
+
+    # listens on a Unix socket, returns the asyncio server
+    async def start_unix(self, path):
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        self._servers.append(server)
+
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+
+        for task in list(self._tasks):
+            task.cancel()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    # reads requests from one client until it disconnects. Engine moves are answered by a task of their
+    # own when the search is done, so the requests after them are not held up in the meantime
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+
+                except ValueError as error:
+                    self._send(writer, {"ok": False, "error": "bad request: %s" % error})
+
+                else:
+                    if request.get("op") == "engine_move":
+                        task = asyncio.ensure_future(self._answer(request, writer))
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+
+                    else:
+                        await self._answer(request, writer)
+
+                await writer.drain()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            for writers in self._subscribers.values():
+                writers.discard(writer)
+
+            writer.close()
+
+    # handles one request and writes its reply, with the request's "ref" copied in. A request that fails
+    # in a way handle_request did not foresee gets an error reply, the connection stays up
+    async def _answer(self, request, writer):
+        try:
+            reply = await self.handle_request(request, writer)
+
+        except Exception as error:
+            reply = {"ok": False, "error": "%s: %s" % (type(error).__name__, error)}
+
+        if "ref" in request:
+            reply["ref"] = request["ref"]
+
+        self._send(writer, reply)
+
+    # writes one JSON line, without waiting (a client that stops reading only fills its own buffer)
+    @staticmethod
+    def _send(writer, message):
+        if not writer.is_closing():
+            writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    # returns the state message for a game
+    def game_state(self, game_id):
+        game = self._games[game_id]
+
+        return {"event": "state", "game": game_id, "fen": game.to_fen(), "state": game.get_game_state(),
+                "turn": game.get_current_player(), "red_in_check": game.is_in_check("red"),
+                "black_in_check": game.is_in_check("black"), "last_move": self._last_moves.get(game_id)}
+
+    # sends a game's state to everyone subscribed to it
+    def _publish(self, game_id):
+        message = self.game_state(game_id)
+
+        for writer in list(self._subscribers.get(game_id, ())):
+            self._send(writer, message)
+
+    # handles one request and returns the reply. writer is the connection the request came from, it is
+    # what subscribe and unsubscribe act on
+    async def handle_request(self, request, writer=None):
+        op = request.get("op")
+        game_id = request.get("game")
+
+        if game_id is not None and not _is_int(game_id) and not isinstance(game_id, str):
+            return {"ok": False, "error": "game must be a string or an integer"}
+
+        if op == "new":
+            fen = request.get("fen")
+
+            if fen is not None and not isinstance(fen, str):
+                return {"ok": False, "error": "fen must be a string"}
+
+            return self._new_game(game_id, fen)
+
+        if game_id not in self._games:
+            return {"ok": False, "error": "unknown game %r" % (game_id,)}
+
+        if op == "state":
+            reply = self.game_state(game_id)
+            del reply["event"]
+            reply["ok"] = True
+
+            return reply
+
+        if op == "make_move":
+            return self._make_move(game_id, request.get("start"), request.get("stop"))
+
+        if op == "engine_move":
+            depth = request.get("depth")
+            time_limit_ms = request.get("movetime")
+
+            for name, value in (("depth", depth), ("movetime", time_limit_ms)):
+                if value is not None and (not _is_int(value) or value < 1):
+                    return {"ok": False, "error": "%s must be a positive integer" % name, "game": game_id}
+
+            return await self._engine_move(game_id, depth, time_limit_ms)
+
+        if op == "legal_moves":
+            moves = [list(move) for move in self._games[game_id].legal_moves()]
+
+            return {"ok": True, "game": game_id, "moves": moves}
+
+        if op == "subscribe":
+            self._subscribers.setdefault(game_id, set()).add(writer)
+
+            return {"ok": True, "game": game_id}
+
+        if op == "unsubscribe":
+            self._subscribers.get(game_id, set()).discard(writer)
+
+            return {"ok": True, "game": game_id}
+
+        if op == "close":
+            del self._games[game_id]
+            self._last_moves.pop(game_id, None)
+            self._subscribers.pop(game_id, None)
+
+            return {"ok": True, "game": game_id}
+
+        return {"ok": False, "error": "unknown op %r" % (op,)}
+
+    def _new_game(self, game_id, fen):
+        if game_id is None:
+            while str(self._next_game_id) in self._games:
+                self._next_game_id += 1
+
+            game_id = str(self._next_game_id)
+
+        if game_id in self._games:
+            return {"ok": False, "error": "game %r already exists" % (game_id,)}
+
+        if fen is None:
+            game = XiangqiGame.XiangqiGame()
+            game.start_game()
+
+        else:
+            try:
+                game = XiangqiGame.XiangqiGame.from_fen(fen)
+
+            except ValueError as error:
+                return {"ok": False, "error": "bad fen: %s" % error}
+
+        self._games[game_id] = game
+
+        return {"ok": True, "game": game_id, "fen": game.to_fen(), "state": game.get_game_state()}
+
+    def _make_move(self, game_id, start, stop):
+        if not isinstance(start, str) or not isinstance(stop, str) or \
+                self._games[game_id].make_move(start, stop) is False:
+            return {"ok": False, "error": "illegal move", "game": game_id}
+
+        self._last_moves[game_id] = [start, stop]
+        self._publish(game_id)
+
+        return {"ok": True, "game": game_id, "state": self._games[game_id].get_game_state()}
+
+    # searches in the process pool and plays the engine's move, unless the game moved on in the meantime
+    async def _engine_move(self, game_id, depth, time_limit_ms):
+        import concurrent.futures
+
+        game = self._games[game_id]
+
+        if game.get_game_state() != "UNFINISHED":
+            return {"ok": False, "error": "game is over", "game": game_id}
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._engine_workers)
+
+        packed = game.pack()
+        move = await asyncio.get_running_loop().run_in_executor(self._executor, _engine_search, packed,
+                                                                depth, time_limit_ms)
+
+        if self._games.get(game_id) is not game or game.pack() != packed:
+            return {"ok": False, "error": "game changed while the engine was thinking", "game": game_id}
+
+        if move is None:
+            return {"ok": False, "error": "no legal move", "game": game_id}
+
+        reply = self._make_move(game_id, *move)
+        reply["move"] = list(move)
+
+        return reply
+
+
+async def _serve(args):
+    server = XiangqiServer(args.engine_workers)
+
+    if args.unix:
+        listener = await server.start_unix(args.unix)
+
+    else:
+        listener = await server.start(args.host, args.port)
+
+    print("serving on %s" % (args.unix or "%s:%d" % (args.host, args.port)))
+
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="newline-delimited JSON Xiangqi game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--engine-workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_serve(args))
+
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
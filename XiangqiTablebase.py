@@ -0,0 +1,393 @@
+# Description: Endgame tablebases for XiangqiGame. For a small set of material (i.e. rook against a bare
+#              general) every position is solved by retrograde analysis with the game's own move rules
+#              and check detection, and the result is stored as one byte per position: win, loss or
+#              draw for the player to move plus the distance to mate in plies. Tables are written to a
+#              directory and memory-mapped when probed.
+#
+# Material is named by its FEN letters, red (upper case) then black (lower case) in the order
+# "KABNRCPkabnrcp", i.e. "KRk" is general and rook against a bare general and "KNPk" knight and pawn
+# against a bare general. Captures lead into smaller tables, which are generated first.
+#
+# Value byte: 0 draw, 1-127 the player to move wins (mates in that many plies), 128-254 the player to
+# move loses (is mated after value - 128 plies), 255 not a legal position.
+#
+# File layout: header magic b"XQTB", version (uint16), flags (uint16, 0), material (16 bytes, padded with
+# zero bytes), position count (uint64), then one value byte per position index.
+#
+# usage: python XiangqiTablebase.py generate KRk tables/
+
+import array
+import mmap
+import os
+import struct
+import sys
+
+import XiangqiGame
+
+
+MAGIC = b"XQTB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHH16sQ")
+
+DRAW = 0
+INVALID = 255
+_MAX_DISTANCE = 126
+
+_LETTER_ORDER = "KABNRCPkabnrcp"
+_PIECE_LIMITS = {"K": 1, "A": 2, "B": 2, "N": 2, "R": 2, "C": 2, "P": 5}
+_FEN_CODES = {letter: code for code, letter in enumerate(" KABNRCPkabnrcp") if letter != " "}
+
+
+# squares (0-89) each kind of piece can ever stand on, the index of a position only spans these
+def _piece_domain(letter):
+    red = letter.isupper()
+    kind = letter.upper()
+    squares = []
+
+    for square in range(90):
+        row, col = divmod(square, 9)
+        own_row = row if red else 9 - row   # rows counted from the piece's own side
+
+        if kind == "K":
+            keep = own_row <= 2 and 3 <= col <= 5
+
+        elif kind == "A":
+            keep = (own_row, col) in ((0, 3), (0, 5), (1, 4), (2, 3), (2, 5))
+
+        elif kind == "B":
+            keep = (own_row, col) in ((0, 2), (0, 6), (2, 0), (2, 4), (2, 8), (4, 2), (4, 6))
+
+        elif kind == "P":
+            keep = own_row >= 3
+
+        else:
+            keep = True
+
+        if keep:
+            squares.append(square)
+
+    return squares
+
+
+# puts material letters in the canonical order, checking there is one general on each side and no more
+# pieces of a kind than a game has
+def normalize_material(material):
+    if material.count("K") != 1 or material.count("k") != 1 or not set(material) <= set(_LETTER_ORDER) or \
+            any(material.count(letter) > _PIECE_LIMITS[letter.upper()] for letter in material) or \
+            len(material) > 16:
+        raise ValueError("material %r needs one K, one k and at most the pieces of a game, as FEN letters"
+                         % material)
+
+    return "".join(sorted(material, key=_LETTER_ORDER.index))
+
+
+# the material left after capturing one non-general piece, one entry per different letter
+def _smaller_materials(material):
+
+    return sorted({material[:i] + material[i + 1:] for i in range(len(material)) if material[i] not in "Kk"})
+
+
+# position indexing for one material set: side to move and the square of every piece, mixed radix
+class _Indexer:
+
+    def __init__(self, material):
+        self.material = material
+        self.domains = [_piece_domain(letter) for letter in material]
+        self.domain_index = [{square: i for i, square in enumerate(domain)} for domain in self.domains]
+        self.codes = [_FEN_CODES[letter] for letter in material]
+        self.size = 2
+
+        for domain in self.domains:
+            self.size *= len(domain)
+
+    # side is 0 for red to move, 1 for black; squares has one square per material letter
+    def index(self, side, squares):
+        index = side
+
+        for piece, square in enumerate(squares):
+            position = self.domain_index[piece].get(square)
+
+            if position is None:
+                return None
+
+            index = index * len(self.domains[piece]) + position
+
+        return index
+
+    # returns (side, squares) for an index
+    def decode(self, index):
+        squares = [0] * len(self.domains)
+
+        for piece in range(len(self.domains) - 1, -1, -1):
+            index, position = divmod(index, len(self.domains[piece]))
+            squares[piece] = self.domains[piece][position]
+
+        return index, squares
+
+
+# solves material and every smaller material its captures lead to, returns {material: bytearray of values}.
+# tables already solved are taken from (and new ones added to) solved. Distances longer than 126 plies
+# are stored as 126
+def solve(material, solved=None, progress=None):
+    material = normalize_material(material)
+
+    if solved is None:
+        solved = {}
+
+    if material in solved:
+        return solved
+
+    for smaller in _smaller_materials(material):
+        solve(smaller, solved, progress)
+
+    indexer = _Indexer(material)
+    smaller_indexers = {smaller: _Indexer(smaller) for smaller in _smaller_materials(material)}
+    values = bytearray(indexer.size)
+    game = XiangqiGame.XiangqiGame()
+    codes = bytearray(90)
+
+    # successor indices inside this table, stored flat with an offset per position
+    successor_offsets = array.array("Q", [0])
+    successors = array.array("I")
+    remaining = array.array("H", bytes(2 * indexer.size))   # moves not yet known to win for the opponent
+    longest_loss = bytearray(indexer.size)   # longest distance among the moves that win for the opponent
+    not_lost = bytearray(indexer.size)   # 1 if a capture leads to a draw or a win for the player to move
+    win_buckets = [[] for i in range(_MAX_DISTANCE + 1)]   # positions to settle, by distance
+    loss_buckets = [[] for i in range(_MAX_DISTANCE + 1)]
+
+    for index in range(indexer.size):
+        side, squares = indexer.decode(index)
+
+        if len(set(squares)) != len(squares):
+            values[index] = INVALID
+            successor_offsets.append(len(successors))
+            continue
+
+        for square, code in zip(squares, indexer.codes):
+            codes[square] = code
+
+        game.place_pieces(codes, "red" if side == 0 else "black")
+
+        for square in squares:
+            codes[square] = 0
+
+        mover = game.get_current_player()
+        waiting = "black" if mover == "red" else "red"
+
+        # the player who just moved cannot have left their general in check or the generals facing
+        if game.general_check(waiting) or game.flying_general():
+            values[index] = INVALID
+            successor_offsets.append(len(successors))
+            continue
+
+        square_to_piece = {square: piece for piece, square in enumerate(squares)}
+        has_moves = False
+
+        for start, stop in game.generate_legal_moves(mover):
+            has_moves = True
+            to_sq = stop[0] * 9 + stop[1]
+            child_squares = list(squares)
+            child_squares[square_to_piece[start[0] * 9 + start[1]]] = to_sq
+            captured = square_to_piece.get(to_sq)
+
+            if captured is None:
+                successors.append(indexer.index(1 - side, child_squares))
+                continue
+
+            # a capture leads into the smaller table, which is solved already
+            del child_squares[captured]
+            smaller = material[:captured] + material[captured + 1:]
+            child_value = solved[smaller][smaller_indexers[smaller].index(1 - side, child_squares)]
+
+            if child_value >= 128:
+                win_buckets[min(child_value - 128 + 1, _MAX_DISTANCE)].append(index)
+                not_lost[index] = 1
+
+            elif child_value == DRAW:
+                not_lost[index] = 1
+
+            else:
+                longest_loss[index] = max(longest_loss[index], child_value)
+
+        successor_offsets.append(len(successors))
+        remaining[index] = successor_offsets[index + 1] - successor_offsets[index]
+
+        # checkmate or stalemate (both lose), or every move is a capture that loses
+        if not has_moves:
+            loss_buckets[0].append(index)
+
+        elif remaining[index] == 0 and not not_lost[index]:
+            loss_buckets[min(longest_loss[index] + 1, _MAX_DISTANCE)].append(index)
+
+        if progress is not None and index % 100000 == 0:
+            progress(material, index, indexer.size)
+
+    # predecessors: the reverse of the successor lists, built flat with a counting pass
+    predecessor_offsets = array.array("Q", bytes(8 * (indexer.size + 1)))
+
+    for child in successors:
+        predecessor_offsets[child + 1] += 1
+
+    for index in range(indexer.size):
+        predecessor_offsets[index + 1] += predecessor_offsets[index]
+
+    predecessors = array.array("I", bytes(4 * len(successors)))
+    fill = array.array("Q", predecessor_offsets)
+
+    for index in range(indexer.size):
+
+        for i in range(successor_offsets[index], successor_offsets[index + 1]):
+            child = successors[i]
+            predecessors[fill[child]] = index
+            fill[child] += 1
+
+    del successors, successor_offsets, fill
+
+    # settles positions in order of distance: a position lost in d plies makes every position leading to it
+    # won in d + 1, and a position whose moves all lead to wins for the opponent is lost. What is never
+    # settled is a draw. Below the cap a distance's buckets are final once emptied, at the cap they fill up
+    # again as they are emptied (everything further away lands there too) and are worked until they stay empty
+    settled = bytearray(indexer.size)
+
+    for distance in range(_MAX_DISTANCE + 1):
+        next_distance = min(distance + 1, _MAX_DISTANCE)
+
+        while loss_buckets[distance] or win_buckets[distance]:
+            losses, loss_buckets[distance] = loss_buckets[distance], []
+            wins, win_buckets[distance] = win_buckets[distance], []
+
+            for index in losses:
+                if settled[index]:
+                    continue
+
+                settled[index] = 1
+                values[index] = 128 + distance
+
+                for i in range(predecessor_offsets[index], predecessor_offsets[index + 1]):
+                    if not settled[predecessors[i]]:
+                        win_buckets[next_distance].append(predecessors[i])
+
+            for index in wins:
+                if settled[index]:
+                    continue
+
+                settled[index] = 1
+                values[index] = distance
+
+                for i in range(predecessor_offsets[index], predecessor_offsets[index + 1]):
+                    parent = predecessors[i]
+
+                    if settled[parent]:
+                        continue
+
+                    remaining[parent] -= 1
+                    longest_loss[parent] = max(longest_loss[parent], distance)
+
+                    if remaining[parent] == 0 and not not_lost[parent]:
+                        loss_buckets[min(longest_loss[parent] + 1, _MAX_DISTANCE)].append(parent)
+
+    solved[material] = values
+
+    return solved
+
+
+# solves material (and the smaller tables it needs) and writes every table to directory as MATERIAL.xqtb
+def generate(material, directory, progress=None):
+    os.makedirs(directory, exist_ok=True)
+    solved = solve(material, progress=progress)
+
+    for name, values in solved.items():
+
+        with open(os.path.join(directory, name + ".xqtb"), "wb") as table_file:
+            table_file.write(_HEADER.pack(MAGIC, VERSION, 0, name.encode("ascii"), len(values)))
+            table_file.write(values)
+
+    return sorted(solved)
+
+
+# probes the tables in a directory, mapping each file the first time a position with its material comes up
+class Tablebase:
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._tables = {}   # material -> (mmap, indexer), or None if there is no file for it
+        self.max_pieces = 0
+
+        for name in os.listdir(directory):
+            if name.endswith(".xqtb"):
+                self.max_pieces = max(self.max_pieces, len(name) - len(".xqtb"))
+
+    def _table(self, material):
+        if material not in self._tables:
+            path = os.path.join(self._directory, material + ".xqtb")
+            self._tables[material] = None
+
+            if os.path.exists(path):
+
+                with open(path, "rb") as table_file:
+                    table_map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+                magic, version, flags, name, count = _HEADER.unpack_from(table_map, 0)
+
+                if magic != MAGIC or version != VERSION or name.rstrip(b"\0").decode("ascii") != material:
+                    raise ValueError("%s is not a version %d tablebase for %s" % (path, VERSION, material))
+
+                self._tables[material] = (table_map, _Indexer(material))
+
+        return self._tables[material]
+
+    # returns ('win' | 'loss' | 'draw', plies to mate) for the player to move in game, or None if the
+    # tablebase has no table for the material on the board
+    def probe(self, game):
+        pieces = sorted(game.piece_squares(), key=lambda piece: _LETTER_ORDER.index(piece[0]))
+
+        if len(pieces) > self.max_pieces:
+            return None
+
+        material = "".join(letter for letter, square in pieces)
+        table = self._table(material)
+
+        if table is None:
+            return None
+
+        table_map, indexer = table
+        side = 0 if game.get_current_player() == "red" else 1
+        index = indexer.index(side, [square for letter, square in pieces])
+
+        if index is None:
+            return None
+
+        value = table_map[_HEADER.size + index]
+
+        if value == INVALID:
+            return None
+
+        if value == DRAW:
+            return "draw", 0
+
+        if value >= 128:
+            return "loss", value - 128
+
+        return "win", value
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="generate Xiangqi endgame tablebases")
+    parser.add_argument("command", choices=["generate"])
+    parser.add_argument("material", help="FEN letters, i.e. KRk or KNPk")
+    parser.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    names = generate(args.material, args.directory,
+                     progress=lambda material, done, total: print("%s: %d / %d" % (material, done, total)))
+    print("wrote %s in %.1f s" % (", ".join(names), time.perf_counter() - start))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+# Description: UCCI engine protocol for XiangqiGame, so the engine can be run by Xiangqi GUIs, tournament
+#              managers and scripts. Commands are read line by line from stdin and answered on stdout.
+#              The search runs on a worker thread, so "stop", "isready" and "quit" are answered while
+#              the engine is thinking.
+#
+# Supported commands:
+#   ucci                                      -> id lines and ucciok
+#   isready                                   -> readyok
+#   position (fen FEN | startpos) [moves M..] sets up the position, i.e. "position startpos moves h2e2 h9g7"
+#   go [depth N | movetime MS | time MS [increment MS] [movestogo N] | infinite]
+#                                             -> info lines while searching, then bestmove M (or nobestmove)
+#   stop                                      ends the search, which then sends its bestmove
+#   quit                                      ends the program
+#
+# Moves are written the UCCI way: file a-i then rank 0-9 counted from red's side, so XiangqiGame's 'h3'
+# is h2 and the cannon move 'h3' -> 'e3' is h2e2.
+#
+# usage: python XiangqiUCCI.py  (or python XiangqiGame.py --ucci)
+
+import sys
+import threading
+
+import XiangqiGame
+
+
+ENGINE_NAME = "XiangqiGame"
+ENGINE_AUTHOR = "XiangqiGame authors"
+_DEFAULT_MOVES_TO_GO = 30
+
+
+# 'h3', 'e3' -> 'h2e2'
+def to_ucci_move(start, stop):
+
+    return "%s%d%s%d" % (start[0], int(start[1:]) - 1, stop[0], int(stop[1:]) - 1)
+
+
+# 'h2e2' -> ('h3', 'e3'), or None if the text is not a move
+def from_ucci_move(text):
+    if len(text) != 4 or text[0] not in "abcdefghi" or text[2] not in "abcdefghi" or \
+            not text[1].isdigit() or not text[3].isdigit():
+
+        return None
+
+    return "%s%d" % (text[0], int(text[1]) + 1), "%s%d" % (text[2], int(text[3]) + 1)
+
+
+class UCCIEngine:
+
+    def __init__(self, output=None):
+        self._output = output if output is not None else sys.stdout
+        self._output_lock = threading.Lock()
+        self._game = XiangqiGame.XiangqiGame()
+        self._game.start_game()
+        self._position = ("startpos", [])   # the last position command, so "moves" can be extended
+        self._search_thread = None
+        self._stop_event = threading.Event()
+
+    # writes one line of protocol output, from either thread
+    def send(self, line):
+        with self._output_lock:
+            self._output.write(line + "\n")
+            self._output.flush()
+
+    # handles one command line, returns False once the engine should exit
+    def handle(self, line):
+        words = line.split()
+
+        if not words:
+
+            return True
+
+        command = words[0]
+
+        if command == "ucci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("id author %s" % ENGINE_AUTHOR)
+            self.send("ucciok")
+
+        elif command == "isready":
+            self.send("readyok")
+
+        elif command == "position":
+            self.stop()
+            self._set_position(words[1:])
+
+        elif command == "go":
+            self.stop()
+            self._go(words[1:])
+
+        elif command == "stop":
+            self.stop()
+
+        elif command == "quit":
+            self.stop()
+
+            return False
+
+        else:
+            self.send("info string unknown command %s" % command)
+
+        return True
+
+    # reads commands from input (stdin by default) until quit or end of input
+    def run(self, input_stream=None):
+        for line in input_stream if input_stream is not None else sys.stdin:
+            if not self.handle(line):
+                break
+
+        self.stop()
+
+    # ends a running search and waits for it to send its bestmove
+    def stop(self):
+        if self._search_thread is not None:
+            self._stop_event.set()
+            self._search_thread.join()
+            self._search_thread = None
+
+    def _set_position(self, words):
+        if "moves" in words:
+            moves = words[words.index("moves") + 1:]
+            words = words[:words.index("moves")]
+
+        else:
+            moves = []
+
+        if words[:1] == ["startpos"]:
+            fen = "startpos"
+
+        elif words[:1] == ["fen"] and len(words) > 1:
+            fen = " ".join(words[1:])
+
+        else:
+            self.send("info string bad position command")
+            return
+
+        # a GUI sends the whole game again every move, only the new moves need to be played
+        previous_fen, previous_moves = self._position
+
+        if fen == previous_fen and moves[:len(previous_moves)] == previous_moves:
+            new_moves = moves[len(previous_moves):]
+
+        else:
+            try:
+                game = XiangqiGame.XiangqiGame.from_fen(XiangqiGame.STARTING_FEN if fen == "startpos" else fen)
+
+            except ValueError as error:
+                self.send("info string bad fen: %s" % error)
+                return
+
+            self._game = game
+            previous_moves = []
+            new_moves = moves
+
+        played = list(previous_moves)
+
+        for text in new_moves:
+            move = from_ucci_move(text)
+
+            if move is None or self._game.make_move(*move) is False:
+                self.send("info string illegal move %s" % text)
+                break
+
+            played.append(text)
+
+        self._position = (fen, played)
+
+    def _go(self, words):
+        depth = None
+        time_limit_ms = None
+        options = {}
+
+        for name, value in zip(words, words[1:] + [""]):
+            if value.isdigit():
+                options[name] = int(value)
+
+        if "depth" in options:
+            depth = max(options["depth"], 1)
+
+        if "movetime" in options:
+            time_limit_ms = options["movetime"]
+
+        elif "time" in options:
+            # a share of the clock that is left plus the increment, keeping a little in reserve
+            moves_to_go = options.get("movestogo", _DEFAULT_MOVES_TO_GO)
+            time_limit_ms = max(min(options["time"] // max(moves_to_go, 1) + options.get("increment", 0),
+                                    options["time"] - 50), 1)
+
+        self._stop_event.clear()
+        self._search_thread = threading.Thread(target=self._search, args=(depth, time_limit_ms), daemon=True)
+        self._search_thread.start()
+
+    # runs on the search thread
+    def _search(self, depth, time_limit_ms):
+        game = self._game
+
+        def report(current_depth, score, principal_variation):
+            self.send("info depth %d score %d nodes %d pv %s"
+                      % (current_depth, score, game.get_search_nodes(),
+                         " ".join(to_ucci_move(start, stop) for start, stop in principal_variation)))
+
+        move, score = game.search(depth, time_limit_ms, stop_event=self._stop_event, on_iteration=report)
+
+        # stopped before the first iteration finished: any legal move is better than none
+        if move is None:
+            move = next(iter(game.legal_moves()), None)
+
+        if move is None:
+            self.send("nobestmove")
+
+        else:
+            self.send("bestmove %s" % to_ucci_move(*move))
+
+
+def main():
+    UCCIEngine().run()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
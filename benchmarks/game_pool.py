@@ -0,0 +1,72 @@
+# Description: Game construction benchmark, reports games per second for building a new XiangqiGame for
+#              every game against reusing games from a GamePool (XiangqiGame.reset). Runs both on empty
+#              games (construction cost only) and on short games replaying the first moves of an opening.
+#              Games keep no move cache across reset(), so the difference is the setup cost alone.
+#
+# usage: python benchmarks/game_pool.py [--games N] [--plies N]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame, GamePool   # noqa: E402
+
+
+# a common opening (central cannon against screen horses), every game replays the first moves of it
+OPENING = [("h3", "e3"), ("h10", "g8"), ("h1", "g3"), ("i10", "h10"), ("i1", "h1"), ("b10", "c8"),
+           ("b1", "c3"), ("b8", "b4")]
+
+
+def play(game, plies):
+    for start, stop in OPENING[:plies]:
+        game.make_move(start, stop)
+
+
+def new_per_game(games, plies):
+    for i in range(games):
+        game = XiangqiGame()
+        game.start_game()
+        play(game, plies)
+
+
+def pooled(games, plies):
+    pool = GamePool()
+
+    for i in range(games):
+        game = pool.acquire()
+        play(game, plies)
+        pool.release(game)
+
+
+# returns games per second for run(games, plies), best of 3
+def games_per_second(run, games, plies):
+    best = None
+
+    for i in range(3):
+        start = time.perf_counter()
+        run(games, plies)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return games / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="games/second, new game objects versus a GamePool")
+    parser.add_argument("--games", type=int, default=20000)
+    parser.add_argument("--plies", type=int, default=4,
+                        help="opening moves replayed in each game (default 4, at most %d)" % len(OPENING))
+    args = parser.parse_args()
+
+    for label, plies in (("setup only", 0), ("%d ply games" % args.plies, args.plies)):
+        new = games_per_second(new_per_game, args.games, plies)
+        reuse = games_per_second(pooled, args.games, plies)
+        print("%-14s new per game: %10.0f games/s   pooled: %10.0f games/s   %5.1fx"
+              % (label, new, reuse, reuse / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Description: Measures the cold import time of XiangqiGame.py in fresh interpreters and fails
+#              (exit code 1) if the median goes over the budget. Importing the module must not
+#              build a game, print anything or wait on input(), so it is also checked here.
+#
+# usage: python benchmarks/import_time.py [--runs N] [--budget-ms MS]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# budget for "import XiangqiGame" alone, interpreter start up is not included
+IMPORT_BUDGET_MS = 5.0
+
+# timed inside the child so only the import itself is measured
+CHILD_CODE = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import XiangqiGame\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(repr(elapsed * 1000.0))\n"
+)
+
+
+# workers run with the compiled .pyc available, so make sure the children can write and use it
+CHILD_ENV = dict(os.environ)
+CHILD_ENV.pop("PYTHONDONTWRITEBYTECODE", None)
+
+
+# runs one cold import in a new interpreter and returns the import time in milliseconds
+def measure_once():
+    result = subprocess.run([sys.executable, "-c", CHILD_CODE], cwd=REPO_DIR, env=CHILD_ENV,
+                            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=30)
+
+    if result.returncode != 0:
+        raise RuntimeError("importing XiangqiGame failed:\n" + result.stderr)
+
+    lines = result.stdout.strip().splitlines()
+
+    # the timing line must be the only output, anything else means the import has side effects
+    if len(lines) != 1:
+        raise RuntimeError("importing XiangqiGame printed output:\n" + result.stdout)
+
+    return float(lines[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cold import time budget check for XiangqiGame")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    measure_once()   # warm up run, compiles XiangqiGame.pyc
+    timings = [measure_once() for i in range(args.runs)]
+    median = statistics.median(timings)
+
+    print("cold import XiangqiGame: median %.2f ms, min %.2f ms, max %.2f ms (%d runs, budget %.1f ms)"
+          % (median, min(timings), max(timings), args.runs, args.budget_ms))
+
+    if median > args.budget_ms:
+        print("FAIL: import time is over budget")
+        return 1
+
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# Description: Memory benchmark, reports bytes per game for live XiangqiGame objects against the same
+#              games kept packed with XiangqiGame.pack(). Live games are measured twice: as played
+#              (undo history, repetition hashes and render cache included) and as rebuilt by
+#              XiangqiGame.unpack(), which has only the board lists and the 32 piece objects.
+#
+# usage: python benchmarks/memory.py [--games N] [--played-games N]
+
+import argparse
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame, Rook   # noqa: E402
+
+
+# plays a few random legal moves so the games are not all the opening position
+def random_game(rng, plies):
+    game = XiangqiGame()
+    game.start_game()
+
+    for i in range(plies):
+        moves = game.legal_moves()
+
+        if not moves or game.get_game_state() != "UNFINISHED":
+            break
+
+        game.make_move(*rng.choice(moves))
+
+    return game
+
+
+# returns the number of bytes allocated per item while build() runs count times
+def bytes_per_item(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bytes per game, live object graph versus packed")
+    parser.add_argument("--games", type=int, default=5000, help="unpacked and packed copies to measure")
+    parser.add_argument("--played-games", type=int, default=50, help="random games to play and measure")
+    args = parser.parse_args()
+
+    # games as a server or self-play loop holds them: played move by move, 0-200 plies long
+    rng = random.Random(2020)
+    random_game(random.Random(0), 20)   # builds the shared move tables, they are not part of any one game
+    games = []
+    played = bytes_per_item(lambda i: games.append(random_game(rng, rng.randrange(0, 200))),
+                            args.played_games)
+
+    fresh = bytes_per_item(lambda i: games[i % len(games)].unpack(games[i % len(games)].pack()), args.games)
+    packed = bytes_per_item(lambda i: games[i % len(games)].pack(), args.games)
+
+    print("live XiangqiGame as played   : %8.0f bytes per game (0-200 random plies)" % played)
+    print("live XiangqiGame from unpack : %8.0f bytes per game (no history or caches)" % fresh)
+    print("packed XiangqiGame.pack()    : %8.0f bytes per game" % packed)
+    print("ratio played / packed        : %8.1fx" % (played / packed))
+    print("ratio unpacked / packed      : %8.1fx" % (fresh / packed))
+    print("one piece object (__slots__) : %8d bytes" % sys.getsizeof(Rook("rook", "a1", "red", "rook r1")))
+
+
+if __name__ == "__main__":
+    main()
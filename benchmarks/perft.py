@@ -0,0 +1,100 @@
+# Description: Perft benchmark and correctness check for XiangqiGame. Counts the legal move tree of each
+#              position to a fixed depth, compares the counts with the published numbers and reports
+#              nodes per second. Exits with code 1 if any count is wrong.
+#
+# usage: python benchmarks/perft.py [--depth N] [--divide]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame   # noqa: E402
+
+
+# returns a game set up at the standard opening position
+def opening_position():
+    game = XiangqiGame()
+    game.start_game()
+
+    return game
+
+
+# returns a function that sets up a game at the FEN position (perft counts moves, game over or not)
+def fen_position(fen):
+
+    return lambda: XiangqiGame.from_fen(fen, check_game_over=False)
+
+
+# (name, function returning the game, known leaf counts for depth 1, 2, 3, ...). Besides the opening
+# these are published middlegame and endgame test positions, with cannon screens, blocked knight legs and
+# elephant eyes, and (middlegame 2) the side to move in check
+PERFT_POSITIONS = [
+    ("opening position", opening_position, [44, 1920, 79666, 3290240, 133312995]),
+    ("middlegame 1", fen_position("r1ba1a3/4kn3/2n1b4/pNp1p1p1p/4c4/6P2/P1P2R2P/1CcC5/9/2BAKAB2 w - - 0 1"),
+     [38, 1128, 43929, 1339047]),
+    ("middlegame 2", fen_position("1cbak4/9/n2a5/2p1p3p/5cp2/2n2N3/6PCP/3AB4/2C6/3A1K1N1 w - - 0 1"),
+     [7, 281, 8620, 326201]),
+    ("middlegame 3", fen_position("1C2ka3/9/C1Nab1n2/p3p3p/6p2/9/P3P3P/3AB4/3p2c2/c1BAK4 w - - 0 1"),
+     [30, 830, 22787]),
+    ("endgame 1", fen_position("5a3/3k5/3aR4/9/5r3/5n3/9/3A1A3/5K3/2BC2B2 w - - 0 1"),
+     [25, 424, 9850, 202884]),
+    ("endgame 2", fen_position("CRN1k1b2/3ca4/4ba3/9/2nr5/9/9/4B4/4A4/4KA3 w - - 0 1"),
+     [28, 516, 14808]),
+    ("endgame 3", fen_position("CnN1k1b2/c3a4/4ba3/9/2nr5/9/9/4C4/4A4/4KA3 w - - 0 1"),
+     [19, 583, 11714, 376467]),
+    ("endgame 4", fen_position("C1nNk4/9/9/9/9/9/n1pp5/B3C4/9/3A1K3 w - - 0 1"),
+     [28, 222, 6241]),
+    ("endgame 5", fen_position("4ka3/4a4/9/9/4N4/p8/9/4C3c/7n1/2BK5 w - - 0 1"),
+     [23, 345, 8124]),
+    ("endgame 6", fen_position("2b1ka3/9/b3N4/4n4/9/9/9/4C4/2p6/2BK5 w - - 0 1"),
+     [21, 195, 3883]),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="perft node counts and nodes/second for XiangqiGame")
+    parser.add_argument("--depth", type=int, default=3, help="deepest depth to run (default 3)")
+    parser.add_argument("--divide", action="store_true", help="print the per move counts at the deepest depth")
+    args = parser.parse_args()
+
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+
+    for name, setup, known_counts in PERFT_POSITIONS:
+
+        for depth in range(1, min(args.depth, len(known_counts)) + 1):
+            game = setup()
+            start = time.perf_counter()
+            nodes = game.perft(depth)
+            elapsed = time.perf_counter() - start
+
+            total_nodes += nodes
+            total_seconds += elapsed
+            status = "ok" if nodes == known_counts[depth - 1] else "WRONG (expected %d)" % known_counts[depth - 1]
+
+            if nodes != known_counts[depth - 1]:
+                failures += 1
+
+            print("%-20s depth %d: %12d nodes %9.3f s %10.0f nodes/s  %s"
+                  % (name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0.0, status))
+
+        if args.divide:
+
+            for move, count in sorted(setup().perft_divide(args.depth).items()):
+                print("    %s%s: %d" % (move[0], move[1], count))
+
+    print("total: %d nodes in %.3f s, %.0f nodes/s" % (total_nodes, total_seconds, total_nodes / total_seconds))
+
+    if failures:
+        print("FAIL: %d perft count(s) did not match" % failures)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+# Description: Lazy SMP speed-up benchmark. Searches each position to a fixed depth with XiangqiSMP's
+#              parallel_search at 1, 2, 4, 8 and 16 worker processes and reports the time to depth,
+#              the nodes searched by all workers and the speed-up over one worker. Speed-up is only
+#              possible up to the number of cores the machine has.
+#
+# usage: python benchmarks/smp_speedup.py [--depth N] [--workers 1,2,4,8,16]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame, STARTING_FEN   # noqa: E402
+from XiangqiSMP import parallel_search   # noqa: E402
+
+
+# (name, FEN)
+POSITIONS = [
+    ("opening position", STARTING_FEN),
+    ("central cannon", "r1bakabr1/9/1cn3nc1/p1p1p1p1p/9/9/P1P1P1P1P/1C2C1N2/9/RNBAKAB1R b - - 0 3"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time to depth of the parallel search by worker count")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workers", default="1,2,4,8,16", help="comma separated worker counts")
+    args = parser.parse_args()
+
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    print("%d cores" % (os.cpu_count() or 1))
+
+    for name, fen in POSITIONS:
+        base_time = None
+
+        for workers in worker_counts:
+            game = XiangqiGame.from_fen(fen)
+            start = time.perf_counter()
+            move, score, nodes = parallel_search(game, depth=args.depth, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            if base_time is None:
+                base_time = elapsed
+
+            print("%-18s depth %d %2d workers: %7.2f s %9d nodes %8.0f nodes/s  speed-up %5.2fx  %s%s %d"
+                  % (name, args.depth, workers, elapsed, nodes, nodes / elapsed, base_time / elapsed,
+                     move[0], move[1], score))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Description: Tests for the check flags XiangqiGame keeps incrementally. play_move only tests for check
+#              again when a move touches a general's lines, so the flags it starts from have to be right
+#              after every way of setting up a position and after every move.
+#
+# usage: python -m pytest tests
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame   # noqa: E402
+
+
+# the flags must match what general_check works out from scratch
+def assert_flags_match(game):
+    assert game.is_in_check("red") == game.general_check("red")
+    assert game.is_in_check("black") == game.general_check("black")
+
+
+def test_place_pieces_sets_check_flags():
+    game = XiangqiGame.from_fen("3k5/9/9/9/9/9/R8/9/9/4K4 w - - 0 1")
+    game.place_pieces(XiangqiGame.from_fen("3k5/9/9/9/4r4/9/R8/9/9/4K4 w - - 0 1").snapshot(), "red")
+
+    assert game.is_in_check("red") is True
+    assert game.make_move("a4", "a5") is False   # leaves the general attacked by the rook on e5
+    assert sorted(game.legal_moves()) == [("a4", "e4"), ("e1", "f1")]
+
+
+def test_from_fen_and_unpack_set_check_flags():
+    game = XiangqiGame.from_fen("3k5/9/9/9/4r4/9/R8/9/9/4K4 w - - 0 1")
+    assert_flags_match(game)
+    assert game.is_in_check("red") is True
+
+    assert_flags_match(XiangqiGame.unpack(game.pack()))
+
+
+def test_flags_after_random_moves():
+    rng = random.Random(162)
+
+    for game_number in range(20):
+        game = XiangqiGame()
+        game.start_game()
+
+        for ply in range(80):
+            moves = game.legal_moves()
+
+            if not moves or game.get_game_state() != "UNFINISHED":
+                break
+
+            mover = game.get_current_player()
+            assert game.make_move(*rng.choice(moves)) is True
+            assert game.general_check(mover) is False
+            assert game.flying_general() is False
+            assert_flags_match(game)
+
+        # taking the moves back restores the flags too
+        while game.pop_move() is not False:
+            assert_flags_match(game)
@@ -0,0 +1,40 @@
+# Description: Tests for XiangqiGame.from_fen: positions that cannot come up in a game are refused with
+#              ValueError, and the game over test can be left out when only the position is wanted.
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame, STARTING_FEN   # noqa: E402
+
+
+@pytest.mark.parametrize("fen", [
+    "9/9/9/9/9/9/9/9/9/4K4 w - - 0 1",   # no black general
+    "3kk4/9/9/9/9/9/9/9/9/4K4 w - - 0 1",   # two black generals
+    "4k4/9/9/9/9/9/9/9/9/K8 w - - 0 1",   # red general outside the palace
+    "4k4/9/9/9/9/9/9/9/A8/4K4 w - - 0 1",   # red guard outside the palace
+    "4k4/9/9/9/9/9/9/9/9/4K4 w - - 0 1",   # generals facing each other, red to move could take
+    "4k4/9/9/9/9/9/9/9/4R4/3K5 w - - 0 1",   # black, who just moved, is in check from the rook
+])
+def test_impossible_positions_are_refused(fen):
+    with pytest.raises(ValueError):
+        XiangqiGame.from_fen(fen)
+
+
+def test_starting_position_round_trips():
+    game = XiangqiGame.from_fen(STARTING_FEN)
+
+    assert game.to_fen() == STARTING_FEN
+    assert game.get_game_state() == "UNFINISHED"
+
+
+def test_game_over_test_is_optional():
+    checkmate = "3k5/9/9/9/9/9/9/9/3RR4/4K4 b - - 0 1"   # the rooks on d2 and e2 mate the general on d10
+
+    assert XiangqiGame.from_fen(checkmate).get_game_state() == "RED_WON"
+    assert XiangqiGame.from_fen(checkmate, check_game_over=False).get_game_state() == "UNFINISHED"
@@ -0,0 +1,45 @@
+# Description: Tests for XiangqiRecords: games written by write_game_records read back move for move, and a
+#              game that cannot be encoded leaves no partly written file behind.
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import XiangqiRecords   # noqa: E402
+
+
+GAMES = [[("h3", "e3"), ("h10", "g8")], [], [("b1", "c3")]]
+
+
+def test_games_read_back(tmp_path):
+    path = str(tmp_path / "games.xqr")
+
+    assert XiangqiRecords.write_game_records(path, GAMES) == 3
+
+    with XiangqiRecords.GameRecordReader(path) as reader:
+        assert [bytes(moves) for moves in reader] == [XiangqiRecords.encode_moves(game) for game in GAMES]
+
+    assert os.listdir(str(tmp_path)) == ["games.xqr"]
+
+
+@pytest.mark.parametrize("bad_game", [[("h3", "z9")], [(12, 90)]])
+def test_bad_game_leaves_the_old_file(tmp_path, bad_game):
+    path = str(tmp_path / "games.xqr")
+    XiangqiRecords.write_game_records(path, GAMES)
+
+    with open(path, "rb") as record_file:
+        before = record_file.read()
+
+    with pytest.raises(ValueError):
+        XiangqiRecords.write_game_records(path, GAMES + [bad_game])
+
+    with open(path, "rb") as record_file:
+        assert record_file.read() == before
+
+    assert os.listdir(str(tmp_path)) == ["games.xqr"]
+
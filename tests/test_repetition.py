@@ -0,0 +1,95 @@
+# Description: Tests for repetition handling in XiangqiGame: a position standing on the board for the third
+#              time is a draw, or a loss for a player who gave check with every move around the cycle, and
+#              the repetition state survives pop_move and a pack()/unpack() round trip.
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame   # noqa: E402
+
+
+# both sides bring a horse out and back, the opening position stands on the board again after it
+KNIGHT_SHUFFLE = [("h1", "g3"), ("h10", "g8"), ("g3", "h1"), ("g8", "h10")]
+
+# the red rook checks the black general from the d and e files while it steps between d10 and e10
+PERPETUAL_FEN = "4k4/9/9/9/9/3R5/9/9/9/5K3 w - - 0 1"
+PERPETUAL_CHECKS = [("d5", "e5"), ("e10", "d10"), ("e5", "d5"), ("d10", "e10")]
+
+
+def play(game, moves):
+    for start, stop in moves:
+        assert game.make_move(start, stop) is True
+
+
+def test_third_repetition_is_a_draw():
+    game = XiangqiGame()
+    game.start_game()
+    play(game, KNIGHT_SHUFFLE)
+
+    assert game.repetition_count() == 2
+    assert game.get_game_state() == "UNFINISHED"
+
+    play(game, KNIGHT_SHUFFLE)
+
+    assert game.repetition_count() == 3
+    assert game.get_game_state() == "DRAW"
+
+
+def test_perpetual_check_loses():
+    game = XiangqiGame.from_fen(PERPETUAL_FEN)
+    play(game, PERPETUAL_CHECKS * 2)
+
+    assert game.repetition_count() == 3
+    assert game.get_game_state() == "BLACK_WON"
+
+
+def test_pop_move_takes_back_the_repetition():
+    game = XiangqiGame()
+    game.start_game()
+    play(game, KNIGHT_SHUFFLE * 2)
+
+    assert game.pop_move() == ("g8", "h10")
+    assert game.get_game_state() == "UNFINISHED"
+    assert game.repetition_count() == 2   # the horse on g3 against g8 after the first and second cycle
+
+    game.make_move("g8", "h10")
+    assert game.get_game_state() == "DRAW"
+
+
+def test_repetitions_span_pack_and_unpack():
+    game = XiangqiGame()
+    game.start_game()
+
+    assert len(game.pack()) == 95   # nothing to repeat yet
+
+    play(game, KNIGHT_SHUFFLE)
+    game = XiangqiGame.unpack(game.pack())
+
+    assert game.repetition_count() == 2
+
+    play(game, KNIGHT_SHUFFLE)
+    assert game.get_game_state() == "DRAW"
+
+    # the checks in a row come along too, perpetual check is still seen across the unpack
+    game = XiangqiGame.from_fen(PERPETUAL_FEN)
+    play(game, PERPETUAL_CHECKS + PERPETUAL_CHECKS[:3])
+    game = XiangqiGame.unpack(game.pack())
+    play(game, PERPETUAL_CHECKS[3:])
+
+    assert game.get_game_state() == "BLACK_WON"
+
+
+def test_positions_before_a_capture_are_not_packed():
+    game = XiangqiGame()
+    game.start_game()
+    play(game, KNIGHT_SHUFFLE[:2])
+
+    assert len(game.pack()) == 95 + 4 + 2 * 8   # checks in a row and the two earlier positions
+
+    play(game, [("b3", "b10")])   # the cannon takes the horse, the earlier positions cannot come back
+
+    assert len(game.pack()) == 95
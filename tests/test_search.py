@@ -0,0 +1,70 @@
+# Description: Tests for the search helpers: the material XiangqiGame keeps incrementally for evaluate()
+#              and the captures-only move generation the quiescence search uses.
+#
+# usage: python -m pytest tests
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame   # noqa: E402
+
+VALUES = {"K": 0, "A": 200, "B": 200, "N": 400, "R": 900, "C": 450, "P": 100}
+
+
+# evaluate() worked out from the pieces on the board
+def material_balance(game):
+    balance = 0
+
+    for letter, square in game.piece_squares():
+        value = VALUES[letter.upper()]
+        red = letter.isupper()
+
+        # a pawn across the river counts double
+        if letter.upper() == "P" and (square // 9 > 4 if red else square // 9 < 5):
+            value *= 2
+
+        balance += value if red else -value
+
+    return balance if game.get_current_player() == "red" else -balance
+
+
+def random_games(count, plies):
+    rng = random.Random(7)
+
+    for game_number in range(count):
+        game = XiangqiGame()
+        game.start_game()
+
+        for ply in range(plies):
+            moves = game.legal_moves()
+
+            if not moves or game.get_game_state() != "UNFINISHED":
+                break
+
+            game.make_move(*rng.choice(moves))
+            yield game
+
+
+def test_evaluate_matches_the_board():
+    for game in random_games(10, 100):
+        assert game.evaluate() == material_balance(game)
+
+
+def test_captures_only_generates_every_capture():
+    for game in random_games(10, 100):
+        color = game.get_current_player()
+        board = game.snapshot()
+        captures = [(start, stop) for start, stop in game.generate_legal_moves(color)
+                    if board[stop[0] * 9 + stop[1]] != 0]
+
+        assert list(game.generate_legal_moves(color, captures_only=True)) == captures
+
+
+def test_evaluate_after_pop_move():
+    game = list(random_games(1, 80))[-1]
+
+    while game.pop_move() is not False:
+        assert game.evaluate() == material_balance(game)
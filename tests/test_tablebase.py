@@ -0,0 +1,39 @@
+# Description: Tests for XiangqiTablebase. Distances longer than the table can store are capped, a position
+#              lost or won past the cap must still come out lost or won, never a draw.
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import XiangqiTablebase   # noqa: E402
+
+
+# 'win', 'loss', 'draw' or 'invalid' for a stored value byte
+def outcome(value):
+    if value == XiangqiTablebase.INVALID:
+        return "invalid"
+
+    if value == XiangqiTablebase.DRAW:
+        return "draw"
+
+    return "loss" if value >= 128 else "win"
+
+
+def test_capped_distances_still_settle(monkeypatch):
+    full = XiangqiTablebase.solve("KRk")["KRk"]
+
+    # KRk mates within 4 plies, a cap of 2 puts the wins in 3 and the losses in 4 past it
+    monkeypatch.setattr(XiangqiTablebase, "_MAX_DISTANCE", 2)
+    capped = XiangqiTablebase.solve("KRk")["KRk"]
+
+    assert [outcome(value) for value in capped] == [outcome(value) for value in full]
+
+    for full_value, capped_value in zip(full, capped):
+        if outcome(full_value) == "win":
+            assert capped_value == min(full_value, 2)
+
+        elif outcome(full_value) == "loss":
+            assert capped_value == 128 + min(full_value - 128, 2)
@@ -0,0 +1,33 @@
+# Description: Tests for taking moves back with XiangqiGame.pop_move.
+#
+# usage: python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from XiangqiGame import XiangqiGame, STARTING_FEN   # noqa: E402
+
+
+def test_pop_move_restores_the_position():
+    game = XiangqiGame()
+    game.start_game()
+    game.make_move("h3", "e3")
+    game.make_move("h10", "g8")
+
+    assert game.pop_move() == ("h10", "g8")
+    assert game.pop_move() == ("h3", "e3")
+    assert game.pop_move() is False
+    assert game.to_fen() == STARTING_FEN
+
+
+def test_placing_pieces_starts_a_new_history():
+    game = XiangqiGame()
+    game.start_game()
+    game.make_move("h3", "e3")
+    game.place_pieces(XiangqiGame.from_fen("3k5/9/9/9/9/9/R8/9/9/4K4 w - - 0 1").snapshot(), "red")
+
+    assert game.pop_move() is False
+    assert game.make_move("a4", "a5") is True
+    assert game.pop_move() == ("a4", "a5")